@@ -1,13 +1,42 @@
+import argparse
 import sys
 import subprocess
-import os
 import platform
 import hashlib
+import mmap
 import re
 import importlib
-from typing import List, Tuple
+import tempfile
+import shutil
+import site
+from concurrent.futures import ThreadPoolExecutor
+from importlib.metadata import distribution, distributions, PackageNotFoundError
+from typing import List, Optional, Tuple
 
 HASH_FILE = ".install_script_hash"
+MAX_DOWNLOAD_WORKERS = 8
+HASH_MMAP_SLICE_SIZE = 1 << 26
+
+# Non-blank, non-comment lines with surrounding whitespace stripped
+_REQUIREMENT_LINE_RE = re.compile(r'^[ \t]*([^#\s][^\r\n]*?)[ \t]*$', re.MULTILINE)
+_PKG_RE = re.compile(r'^[a-zA-Z0-9_.-]+([<>=!]=?[a-zA-Z0-9_.-]+)?\Z')
+_SEPARATOR_RE = re.compile(r'[-_.]+')
+_SPECIFIER_RE = re.compile(r'[<>=!]')
+_FAILED_REQUIREMENT_RE = re.compile(r'(?:satisfies the requirement|distribution found for) (\S+)')
+_SYSTEM = platform.system().lower()
+_PYTHON_DOWNLOAD_INSTRUCTIONS = {
+    "windows": "Download Python from https://www.python.org/downloads/windows/",
+    "darwin": "Download Python from https://www.python.org/downloads/mac-osx/",
+    "linux": "Use your distribution's package manager to install Python, or visit https://www.python.org/downloads/source/",
+}
+
+# uv resolves and downloads in parallel within a single process, so prefer it when available.
+# It has no --user mode, so it is only used inside a virtual environment.
+UV_EXECUTABLE = shutil.which("uv") if sys.prefix != sys.base_prefix else None
+
+# Resolved once for this interpreter and reused by every install and uninstall
+_PIP_PREFIX = [sys.executable, "-m", "pip"]
+_UV_INSTALL_COMMAND = [UV_EXECUTABLE, "pip", "install", "--python", sys.executable] if UV_EXECUTABLE else []
 
 def check_python_installation() -> bool:
     """Check if Python is installed and accessible."""
@@ -19,82 +48,106 @@ def check_python_installation() -> bool:
 
 def get_python_download_instructions() -> str:
     """Get instructions for downloading Python based on the operating system."""
-    system = platform.system().lower()
-    if system == "windows":
-        return "Download Python from https://www.python.org/downloads/windows/"
-    elif system == "darwin":
-        return "Download Python from https://www.python.org/downloads/mac-osx/"
-    elif system == "linux":
-        return "Use your distribution's package manager to install Python, or visit https://www.python.org/downloads/source/"
-    else:
-        return "Visit https://www.python.org/downloads/ to download Python for your operating system."
+    return _PYTHON_DOWNLOAD_INSTRUCTIONS.get(
+        _SYSTEM, "Visit https://www.python.org/downloads/ to download Python for your operating system.")
 
 def read_requirements(file_path: str) -> List[str]:
     """Safely read the requirements file."""
     try:
         with open(file_path, 'r') as f:
-            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+            return _REQUIREMENT_LINE_RE.findall(f.read())
+    except FileNotFoundError:
+        print(f"Error: {file_path} not found in the current directory.")
     except IOError as e:
         print(f"Error reading requirements file: {e}")
-        return []
+    return []
 
 def validate_package_name(package: str) -> bool:
     """Validate package name to prevent arbitrary code execution."""
-    return bool(re.match(r'^[a-zA-Z0-9_.-]+([<>=!]=?[a-zA-Z0-9_.-]+)?$', package))
+    return _PKG_RE.match(package) is not None
+
+def download_package(package: str, cache_dir: str) -> Tuple[bool, str]:
+    """Download a single package into the cache directory without installing it."""
+    try:
+        # uv has no download subcommand, so this always goes through pip
+        result = subprocess.run([sys.executable, "-m", "pip", "download", "--no-deps", "-d", cache_dir, package], 
+                                check=True, capture_output=True, text=True)
+        return True, result.stdout
+    except subprocess.CalledProcessError as e:
+        return False, e.stderr
+
+def download_packages(packages: List[str], cache_dir: str) -> bool:
+    """Download packages in parallel, returning whether all of them succeeded."""
+    with ThreadPoolExecutor(max_workers=min(MAX_DOWNLOAD_WORKERS, len(packages))) as executor:
+        results = list(executor.map(lambda package: download_package(package, cache_dir), packages))
+
+    all_downloaded = True
+    for package, (success, output) in zip(packages, results):
+        if not success:
+            print(f"Failed to download {package}")
+            print(f"Error: {output}")
+            all_downloaded = False
+    return all_downloaded
 
-def install_package(package: str) -> Tuple[bool, str]:
-    """Install a single package using pip."""
+def install_packages(packages: List[str], find_links: Optional[str] = None, use_uv: bool = False) -> Tuple[bool, str]:
+    """Install packages using a single pip (or uv) invocation."""
+    command = list(_UV_INSTALL_COMMAND) if use_uv else [*_PIP_PREFIX, "install"]
+    if find_links:
+        command += ["--find-links", find_links]
     try:
-        result = subprocess.run([sys.executable, "-m", "pip", "install", package], 
+        result = subprocess.run([*command, *packages], 
                                 check=True, capture_output=True, text=True)
         return True, result.stdout
     except subprocess.CalledProcessError as e:
         return False, e.stderr
 
+def find_failed_package(error_output: str) -> Optional[str]:
+    """Find the requirement pip reported as failing, if any."""
+    match = _FAILED_REQUIREMENT_RE.search(error_output)
+    return match.group(1) if match else None
+
 def uninstall_package(package: str) -> None:
     """Uninstall a single package using pip."""
     try:
-        subprocess.run([sys.executable, "-m", "pip", "uninstall", "-y", package], 
+        subprocess.run([*_PIP_PREFIX, "uninstall", "-y", package], 
                        check=True, capture_output=True)
         print(f"Uninstalled {package}")
     except subprocess.CalledProcessError as e:
         print(f"Failed to uninstall {package}: {e}")
 
+def canonicalize_name(name: str) -> str:
+    """Normalize a distribution name so hyphens, underscores and dots compare equal (PEP 503)."""
+    return _SEPARATOR_RE.sub("-", name).lower()
+
 def verify_installation(package: str) -> bool:
     """Verify that a package was successfully installed."""
-    package_name = package.split('==')[0]
+    package_name = canonicalize_name(_SPECIFIER_RE.split(package, maxsplit=1)[0])
     try:
-        # First, try to import the package directly
-        importlib.import_module(package_name)
+        # Read the installed metadata instead of importing the package
+        distribution(package_name)
         return True
-    except ImportError:
-        # If direct import fails, try common variations
-        variations = [
-            package_name.replace('-', '_'),  # Replace hyphens with underscores
-            package_name.split('-')[-1],     # Try the last part of the name
-            ''.join(part for part in package_name.split('-'))  # Remove hyphens entirely
-        ]
-        for variation in variations:
-            try:
-                importlib.import_module(variation)
-                return True
-            except ImportError:
-                continue
-    
-    # If all attempts fail, try pip show as a last resort
-    try:
-        result = subprocess.run([sys.executable, "-m", "pip", "show", package_name], 
-                                check=True, capture_output=True, text=True)
-        return "Version:" in result.stdout
-    except subprocess.CalledProcessError:
-        return False
+    except PackageNotFoundError:
+        # pip may have fallen back to a user install whose directory was not on sys.path at startup
+        user_site = [site.getusersitepackages()]
+        return next(iter(distributions(name=package_name, path=user_site)), None) is not None
 
 def calculate_file_hash(file_path: str) -> str:
     """Calculate the SHA-256 hash of a file."""
     sha256_hash = hashlib.sha256()
-    with open(file_path, "rb") as f:
-        for byte_block in iter(lambda: f.read(4096), b""):
-            sha256_hash.update(byte_block)
+    with open(file_path, "rb", buffering=0) as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # Empty and special files cannot be mapped, so read them directly
+            sha256_hash.update(f.read())
+            return sha256_hash.hexdigest()
+
+        with mapped, memoryview(mapped) as view:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            # hashlib releases the GIL on large buffers, so feed the mapping in big slices
+            for offset in range(0, len(view), HASH_MMAP_SLICE_SIZE):
+                sha256_hash.update(view[offset:offset + HASH_MMAP_SLICE_SIZE])
     return sha256_hash.hexdigest()
 
 def save_script_hash(hash_value: str) -> None:
@@ -130,7 +183,7 @@ def self_check() -> bool:
     
     return True
 
-def main():
+def main(use_uv: bool = True):
     if not self_check():
         print("Exiting for security reasons.")
         return
@@ -140,25 +193,66 @@ def main():
         print(get_python_download_instructions())
         return
 
-    requirements_file = 'requirements.txt'
-    if not os.path.exists(requirements_file):
-        print(f"Error: {requirements_file} not found in the current directory.")
-        return
-
-    requirements = read_requirements(requirements_file)
+    requirements = read_requirements('requirements.txt')
     if not requirements:
         print("No packages to install.")
         return
 
-    print("Installing packages...")
-    installed_packages = []
+    packages = []
     for package in requirements:
         if not validate_package_name(package):
             print(f"Invalid package name: {package}. Skipping.")
             continue
+        packages.append(package)
+
+    if not packages:
+        print("No valid packages to install.")
+        return
+
+    # uv downloads in parallel itself, so only the pip path stages packages locally
+    with tempfile.TemporaryDirectory() as cache_dir:
+        batch_success, output = False, None
+        if use_uv and UV_EXECUTABLE:
+            print("Installing packages with uv...")
+            batch_success, _ = install_packages(packages, use_uv=True)
+            if not batch_success:
+                print("uv could not install the packages. Falling back to pip...")
+
+        if not batch_success:
+            print("Downloading packages...")
+            if download_packages(packages, cache_dir):
+                print("Installing packages...")
+                batch_success, output = install_packages(packages, cache_dir)
+            else:
+                # The batch would fail on the same package, so go straight to individual installs
+                print("Some packages failed to download. Installing packages individually...")
+
+        if not batch_success and output is not None:
+            failed_package = find_failed_package(output)
+            if failed_package:
+                print(f"Batch installation failed on {failed_package}. Retrying packages individually...")
+            else:
+                print("Batch installation failed. Retrying packages individually...")
+
+        # Make sure metadata for freshly installed distributions is picked up
+        importlib.invalidate_caches()
+
+        installed_packages = []
+        for package in packages:
+            if not batch_success:
+                # Reuse whatever was already downloaded instead of fetching it again
+                success, output = install_packages([package], cache_dir)
+                if not success:
+                    print(f"Failed to install {package}")
+                    print(f"Error: {output}")
+                    rollback = input("Do you want to roll back the installations? (y/n): ").lower() == 'y'
+                    if rollback:
+                        for installed_package in installed_packages:
+                            uninstall_package(installed_package)
+                        print("Rolled back installations.")
+                        return
+                    continue
 
-        success, output = install_package(package)
-        if success:
             print(f"Successfully installed {package}")
             if verify_installation(package):
                 print(f"Verified installation of {package}")
@@ -166,18 +260,12 @@ def main():
             else:
                 print(f"Warning: Failed to verify installation of {package}")
                 print("The package may still be installed correctly. Please check manually.")
-        else:
-            print(f"Failed to install {package}")
-            print(f"Error: {output}")
-            rollback = input("Do you want to roll back the installations? (y/n): ").lower() == 'y'
-            if rollback:
-                for installed_package in installed_packages:
-                    uninstall_package(installed_package)
-                print("Rolled back installations.")
-                return
 
     print("Installation process completed.")
     print("The hash file is to check if the install script hasn't been modified to prevent malicious use of the install script from the user or external parties.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Install the packages listed in requirements.txt.")
+    parser.add_argument("--no-uv", action="store_true",
+                        help="always install with pip, even inside a virtual environment where uv is available")
+    main(use_uv=not parser.parse_args().no_uv)
\ No newline at end of file
@@ -1,23 +1,39 @@
+import argparse
+import asyncio
 import csv
 import pandas as pd
 import cohere
 import os
+import sys
 from dotenv import load_dotenv
 from typing import Optional, List
 from colorama import init, Fore, Style
 
+# Only decorate output with ANSI colors when writing to a terminal
+USE_COLOR = sys.stdout.isatty()
+
 # Initialize colorama
-init(autoreset=True)
+if USE_COLOR:
+    init(autoreset=True)
 
 # Define color constants
 PRIMARY_COLOR = Fore.WHITE
 ACCENT_COLOR = Fore.CYAN
 SECONDARY_COLOR = Fore.LIGHTGREEN_EX
 
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Rows requested per expansion call and how many calls may be in flight at once
+BATCH_SIZE = 50
+MAX_CONCURRENT_REQUESTS = 4
+
+def colorize(text: str, color: str) -> str:
+    return f"{color}{text}{Style.RESET_ALL}" if USE_COLOR else text
+
 def colored_print(text: str, color: str = Fore.RESET):
-    print(f"{color}{text}{Style.RESET_ALL}")
+    sys.stdout.write(f"{colorize(text, color)}\n")
 
-def get_cohere_client() -> Optional[cohere.Client]:
+def get_cohere_client() -> Optional[cohere.AsyncClient]:
     load_dotenv()
     api_key = os.getenv('COHERE_API_KEY')
     
@@ -26,17 +42,14 @@ def get_cohere_client() -> Optional[cohere.Client]:
         api_key = input("Please enter your Cohere API key: ").strip()
     
     try:
-        return cohere.Client(api_key)
+        return cohere.AsyncClient(api_key)
     except cohere.CohereError as e:
         colored_print(f"Error initializing Cohere client: {e}", SECONDARY_COLOR)
         return None
 
-def read_csv_sample(file_path: str, sample_size: int = 5) -> Optional[pd.DataFrame]:
+def read_csv_file(file_path: str) -> Optional[pd.DataFrame]:
     try:
-        df = pd.read_csv(file_path)
-        headers = df.columns.tolist()
-        sample = df.tail(sample_size)
-        return pd.DataFrame([headers] + sample.values.tolist())
+        return pd.read_csv(file_path)
     except FileNotFoundError:
         colored_print(f"Error: File '{file_path}' not found.", SECONDARY_COLOR)
     except pd.errors.EmptyDataError:
@@ -45,10 +58,12 @@ def read_csv_sample(file_path: str, sample_size: int = 5) -> Optional[pd.DataFra
         colored_print(f"Error reading CSV file: {e}", SECONDARY_COLOR)
     return None
 
-def analyze_dataset(co: cohere.Client, sample_df: pd.DataFrame, system_prompt: str) -> Optional[str]:
-    sample_str = sample_df.to_string(index=False, header=False)
+def build_sample(df: pd.DataFrame, sample_size: int = 5) -> pd.DataFrame:
+    return pd.DataFrame([df.columns.tolist()] + df.tail(sample_size).values.tolist())
+
+async def analyze_dataset(co: cohere.AsyncClient, sample_str: str, system_prompt: str) -> Optional[str]:
     try:
-        response = co.chat(
+        response = await co.chat(
             model="command-r-plus",
             message=f"Analyze this dataset sample:\n\n{sample_str}",
             temperature=0.1,
@@ -59,10 +74,9 @@ def analyze_dataset(co: cohere.Client, sample_df: pd.DataFrame, system_prompt: s
         colored_print(f"Error during dataset analysis: {e}", SECONDARY_COLOR)
         return None
 
-def expand_dataset(co: cohere.Client, sample_df: pd.DataFrame, analysis: str, system_prompt: str, num_new_rows: int) -> Optional[str]:
-    sample_str = sample_df.to_string(index=False, header=False)
+async def expand_dataset(co: cohere.AsyncClient, sample_str: str, analysis: str, system_prompt: str, num_new_rows: int) -> Optional[str]:
     try:
-        response = co.chat(
+        response = await co.chat(
             model="command-r-plus",
             message=f"Based on this sample dataset:\n\n{sample_str}\n\nAnd this analysis:\n{analysis}\n\nGenerate {num_new_rows} new rows for this dataset. Format the output as a CSV string without headers.",
             temperature=1,
@@ -73,19 +87,29 @@ def expand_dataset(co: cohere.Client, sample_df: pd.DataFrame, analysis: str, sy
         colored_print(f"Error during dataset expansion: {e}", SECONDARY_COLOR)
         return None
 
-def append_to_csv(file_path: str, new_data: str) -> None:
-    try:
-        with open(file_path, 'a', newline='') as f:
-            writer = csv.writer(f)
-            for row in csv.reader(new_data.splitlines()):
-                writer.writerow(row)
-    except IOError as e:
-        colored_print(f"Error appending to CSV file: {e}", SECONDARY_COLOR)
+async def expand_batch(semaphore: asyncio.Semaphore, co: cohere.AsyncClient, sample_str: str, analysis: str, system_prompt: str, num_new_rows: int) -> Optional[str]:
+    async with semaphore:
+        return await expand_dataset(co, sample_str, analysis, system_prompt, num_new_rows)
+
+def append_to_csv(f, new_data: str, columns: List[str], strict: bool = False) -> int:
+    if strict:
+        rows = [row for row in csv.reader(new_data.splitlines()) if row]
+        if any(len(row) != len(columns) for row in rows):
+            colored_print(f"Skipping batch with rows that do not have {len(columns)} columns.", SECONDARY_COLOR)
+            return 0
+        csv.writer(f, lineterminator=os.linesep).writerows(rows)
+        return len(rows)
+
+    # The expander prompt already asks for plain CSV rows, so write them through as-is
+    lines = [line for line in new_data.splitlines() if line.strip()]
+    if lines:
+        f.write(os.linesep.join(lines) + os.linesep)
+    return len(lines)
 
 def get_user_input(prompt: str, input_type: type) -> Optional[any]:
     while True:
         try:
-            user_input = input(f"{PRIMARY_COLOR}{prompt}{Style.RESET_ALL}")
+            user_input = input(colorize(prompt, PRIMARY_COLOR))
             return input_type(user_input)
         except ValueError:
             colored_print(f"Invalid input. Please enter a valid {input_type.__name__}.", SECONDARY_COLOR)
@@ -93,7 +117,49 @@ def get_user_input(prompt: str, input_type: type) -> Optional[any]:
             colored_print("\nOperation cancelled by user.", ACCENT_COLOR)
             return None
 
-def main():
+async def run_expansion(co: cohere.AsyncClient, sample_df: pd.DataFrame, original_df: pd.DataFrame, output_file: str,
+                        analyzer_prompt: str, expander_prompt: str, rows_to_add: int, strict: bool = False) -> Optional[int]:
+    # Every prompt embeds the same sample, so stringify it only once
+    sample_str = sample_df.to_string(index=False, header=False)
+
+    colored_print("\nAnalyzing the dataset...", ACCENT_COLOR)
+    analysis = await analyze_dataset(co, sample_str, analyzer_prompt)
+    if analysis is None:
+        return None
+    colored_print("Analysis complete.", ACCENT_COLOR)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    batches = [
+        asyncio.ensure_future(expand_batch(semaphore, co, sample_str, analysis, expander_prompt, min(BATCH_SIZE, rows_to_add - start)))
+        for start in range(0, rows_to_add, BATCH_SIZE)
+    ]
+
+    rows_added = 0
+    colored_print("Expanding dataset, this can take a while. Go take a break ;)", PRIMARY_COLOR)
+    try:
+        with open(output_file, 'w', newline='', buffering=OUTPUT_BUFFER_SIZE) as f:
+            original_df.to_csv(f, index=False)
+            columns = original_df.columns.tolist()
+            # Write batches in completion order so rows reach the disk as soon as they arrive
+            for next_batch in asyncio.as_completed(batches):
+                new_data = await next_batch
+                if new_data is None:
+                    colored_print("Failed to expand dataset. Exiting.", SECONDARY_COLOR)
+                    return None
+                rows_added += append_to_csv(f, new_data, columns, strict)
+                # Flush after every batch so progress survives an interrupted run
+                f.flush()
+                colored_print(f"Progress: {rows_added}/{rows_to_add} rows added", ACCENT_COLOR)
+    except IOError as e:
+        colored_print(f"Error writing to CSV file: {e}", SECONDARY_COLOR)
+        return None
+    finally:
+        for batch in batches:
+            batch.cancel()
+
+    return rows_added
+
+def main(strict: bool = False):
     colored_print("Welcome to the Dataset Expander!", PRIMARY_COLOR)
     
     while True:
@@ -108,11 +174,13 @@ def main():
         if not input_file:
             return
 
-        sample_df = read_csv_sample(input_file)
-        if sample_df is not None:
+        original_df = read_csv_file(input_file)
+        if original_df is not None:
             break
         colored_print("Please try again with a valid CSV file.", ACCENT_COLOR)
 
+    sample_df = build_sample(original_df)
+
     while True:
         target_rows = get_user_input("Enter the desired number of rows for the expanded dataset: ", int)
         if target_rows is not None and target_rows > 0:
@@ -122,12 +190,6 @@ def main():
     analyzer_prompt = "You are an AI agent that analyzes the csv provided by the user. The focus of your analysis should be on what the data is, how it is formatted, what each column stands for, and how new data should look like."
     expander_prompt = "You are an AI agent that generates new csv rows based on analysis results and sample data. Follow the exact formatting and you should NEVER output any extra text besides the formatted data. No confirmation, nothing JUST THE FORMATTED DATA! Do NOT explain your actions nor use quotations in your response."
 
-    try:
-        original_df = pd.read_csv(input_file)
-    except Exception as e:
-        colored_print(f"Error reading the original CSV file: {e}", SECONDARY_COLOR)
-        return
-
     current_rows = len(original_df)
     colored_print(f"\nOriginal dataset has {current_rows} rows.", ACCENT_COLOR)
 
@@ -138,29 +200,16 @@ def main():
 
     colored_print(f"Will add {rows_to_add} new rows to the dataset.", ACCENT_COLOR)
 
-    colored_print("\nAnalyzing the dataset...", ACCENT_COLOR)
-    analysis = analyze_dataset(co, sample_df, analyzer_prompt)
-    if analysis is None:
-        return
-    colored_print("Analysis complete.", ACCENT_COLOR)
-
     output_file = f"expanded_{os.path.basename(input_file)}"
-    original_df.to_csv(output_file, index=False)
-
-    rows_added = 0
-    colored_print("Expanding dataset, this can take a while. Go take a break ;)", PRIMARY_COLOR)
-    while rows_added < rows_to_add:
-        new_rows = min(50, rows_to_add - rows_added)
-        new_data = expand_dataset(co, sample_df, analysis, expander_prompt, new_rows)
-        if new_data is None:
-            colored_print("Failed to expand dataset. Exiting.", SECONDARY_COLOR)
-            return
-        append_to_csv(output_file, new_data)
-        rows_added += new_rows
-        colored_print(f"Progress: {rows_added}/{rows_to_add} rows added", ACCENT_COLOR)
+    rows_added = asyncio.run(run_expansion(co, sample_df, original_df, output_file, analyzer_prompt, expander_prompt, rows_to_add, strict))
+    if rows_added is None:
+        return
 
     colored_print(f"\nDataset expansion complete. {rows_added} new rows added.", PRIMARY_COLOR)
     colored_print(f"Expanded dataset saved as '{output_file}'", SECONDARY_COLOR)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Expand a CSV dataset using Cohere.")
+    parser.add_argument("--strict", action="store_true",
+                        help="parse generated rows as CSV and skip batches whose column count does not match")
+    main(parser.parse_args().strict)
\ No newline at end of file